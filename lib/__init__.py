@@ -1 +1,3 @@
-from .duplex import Duplex
\ No newline at end of file
+from .duplex import Duplex
+from .stream import coalesce
+from .admission import Admission, uploads
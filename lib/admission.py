@@ -0,0 +1,47 @@
+import asyncio
+import weakref
+
+
+class Admission:
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self._conditions = weakref.WeakKeyDictionary()
+
+    @property
+    def condition(self) -> asyncio.Condition:
+        # A Condition binds to the first loop that waits on it, so each loop gets its own.
+        loop = asyncio.get_running_loop()
+        if (condition := self._conditions.get(loop)) is None:
+            condition = self._conditions[loop] = asyncio.Condition()
+        return condition
+
+    async def acquire(self):
+        condition = self.condition
+        async with condition:
+            await condition.wait_for(lambda: self.active < self.limit)
+            self.active += 1
+
+    async def release(self):
+        condition = self.condition
+        async with condition:
+            self.active -= 1
+            condition.notify(1)
+
+    async def set_limit(self, limit: int):
+        condition = self.condition
+        async with condition:
+            if limit > self.limit:
+                condition.notify_all()
+            self.limit = limit
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.release()
+
+
+uploads = Admission(64)
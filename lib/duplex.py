@@ -1,25 +1,47 @@
+import re
 import asyncio
 import weakref
 from fastapi import Request
-from dataclasses import dataclass
+from functools import cached_property
+from urllib.parse import quote
+from dataclasses import dataclass, field
 
+from lib.logging import get_logger
 
-@dataclass
+log = get_logger('duplex')
+
+_unsafe_header_chars = re.compile(r'[^\x20-\x7e]|["\\]')
+_end_of_stream = object()
+
+
+@dataclass(slots=True, frozen=True)
 class File:
     size: int
     name: str = None
     content_type: str = None
+    content_disposition: str = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        name = self.name or 'download'
+        fallback = _unsafe_header_chars.sub('', name).strip() or 'download'
+        disposition = f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(name, safe='')}"
+        object.__setattr__(self, 'content_disposition', disposition)
 
 
 class Duplex:
 
     instances = weakref.WeakValueDictionary()
+    _event_pools = weakref.WeakKeyDictionary()
+    _event_pool_size = 64
 
     def __init__(self, identifier: str, file: File):
         self.identifier = identifier
         self.file = file
         self.queue = asyncio.Queue(1)
-        self.client_connected = asyncio.Event()
+        self.closed = False
+        self.completed = False
+        self.client_connected = self._acquire_event()
+        self.sender_ready = self._acquire_event()
 
     @staticmethod
     def get_file_from_request(request: Request):
@@ -32,12 +54,8 @@ class Duplex:
 
     @staticmethod
     def get_file_from_header(header: dict):
-        file = File(
-            name=header['file_name'],
-            size=int(header['file_size']),
-            content_type=header['file_type']
-        )
-        return file
+        name, size, content_type = header['file_name'], header['file_size'], header['file_type']
+        return File(int(size), name, content_type)
 
     @classmethod
     def create_duplex(cls, identifier: str, file: File):
@@ -45,14 +63,32 @@ class Duplex:
         cls.instances[identifier] = duplex
         return duplex
 
+    @classmethod
+    def _acquire_event(cls):
+        # Events bind to the first loop that waits on them, so each loop gets its own pool.
+        pool = cls._event_pools.get(asyncio.get_running_loop())
+        return pool.pop() if pool else asyncio.Event()
+
+    @classmethod
+    def _release_event(cls, event: asyncio.Event):
+        pool = cls._event_pools.setdefault(asyncio.get_running_loop(), [])
+        if len(pool) < cls._event_pool_size:
+            event.clear()
+            pool.append(event)
+
+    @classmethod
+    def exists(cls, identifier: str) -> bool:
+        return identifier in cls.instances
+
     @classmethod
     def get(cls, identifier: str):
         if duplex := cls.instances.get(identifier):
             return duplex
         raise KeyError(f"Duplex '{identifier}' not found.")
 
-    def get_file_info(self):
-        return self.file.name, self.file.size, self.file.content_type
+    @cached_property
+    def response_headers(self):
+        return {"Content-Disposition": self.file.content_disposition, "Content-Length": str(self.file.size)}
 
     async def wait_for_empty_queue(self, seconds=600):
         while not self.queue.empty() and seconds > 0:
@@ -61,22 +97,38 @@ class Duplex:
 
     async def transfer(self, stream):
         bytes_read = 0
+        if self.closed:
+            return bytes_read
+        self.sender_ready.set()
 
         async for chunk in stream:
             bytes_read += len(chunk)
             await self.queue.put(chunk)
+            if self.closed:
+                return bytes_read
 
-        await self.queue.put(None)
+        await self.queue.put(_end_of_stream)
         await self.wait_for_empty_queue()
         return bytes_read
 
     async def receive(self):
-        while True:
-            chunk = await self.queue.get()
-            if chunk is not None:
+        try:
+            while (chunk := await self.queue.get()) is not _end_of_stream:
                 yield chunk
-            else:
-                break
-
-    def __del__(self):
-        print(f"Deleting duplex '{self.identifier}'. {len(self.instances) - 1} duplexes remaining.")
+            self.completed = True
+        finally:
+            self.close()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        # Unblock a sender waiting on put() so it can notice the receiver is gone.
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        if self.instances.get(self.identifier) is self:
+            del self.instances[self.identifier]
+        self._release_event(self.client_connected)
+        self._release_event(self.sender_ready)
+        self.client_connected = self.sender_ready = None
+        log.debug("Closed duplex '%s'. %d duplexes remaining.", self.identifier, len(self.instances))
@@ -0,0 +1,30 @@
+import sys
+import queue
+import atexit
+import logging
+import logging.handlers
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+
+    def prepare(self, record):
+        # The listener lives in this process, so records need no pickling and are formatted over there.
+        return record
+
+
+def get_logger(name: str) -> logging.Logger:
+    root = logging.getLogger('transit')
+    if not root.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s [%(name)s] %(message)s'))
+
+        # Formatting and writing happen on the listener thread, off the event loop.
+        records = queue.SimpleQueue()
+        listener = logging.handlers.QueueListener(records, handler)
+        listener.start()
+        atexit.register(listener.stop)
+
+        root.addHandler(_QueueHandler(records))
+        root.setLevel(logging.INFO)
+        root.propagate = False
+    return root.getChild(name)
@@ -0,0 +1,46 @@
+import asyncio
+from typing import AsyncIterator
+
+
+async def coalesce(stream: AsyncIterator[bytes], size: int = 256 * 1024, flush_after: float = None):
+    buffer = bytearray()
+    chunks = aiter(stream)
+    pending = None
+
+    try:
+        while True:
+            if pending is None and not (buffer and flush_after):
+                try:
+                    chunk = await anext(chunks)
+                except StopAsyncIteration:
+                    break
+            else:
+                # Keep the pending read alive across a flush so no chunk is lost.
+                pending = pending or asyncio.ensure_future(anext(chunks))
+                done, _ = await asyncio.wait((pending,), timeout=flush_after if buffer else None)
+                if not done:
+                    yield bytes(buffer)
+                    buffer.clear()
+                    continue
+                task, pending = pending, None
+                try:
+                    chunk = task.result()
+                except StopAsyncIteration:
+                    break
+
+            if not buffer and len(chunk) == size:
+                yield chunk
+                continue
+
+            buffer += chunk
+            while len(buffer) >= size:
+                with memoryview(buffer) as view:
+                    block = bytes(view[:size])
+                del buffer[:size]
+                yield block
+    finally:
+        if pending is not None:
+            pending.cancel()
+
+    if buffer:
+        yield bytes(buffer)
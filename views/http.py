@@ -1,16 +1,31 @@
+import re
 import asyncio
 from fastapi import Request, APIRouter
 from fastapi.responses import StreamingResponse, PlainTextResponse
 
-from lib import Duplex
+from lib import Duplex, coalesce, uploads
+from lib.logging import get_logger
 
 router = APIRouter()
+log = get_logger('http')
+
+_invalid_identifier = re.compile(r'[./]').search
+
+INVALID_REQUEST = PlainTextResponse("Invalid request.", status_code=400)
+NOT_FOUND = PlainTextResponse("File not found.", status_code=404)
+LENGTH_REQUIRED = PlainTextResponse("Content-Length header required.", status_code=411)
 
 
 @router.put("/{identifier}/{file_name}")
 async def http_upload(request: Request, identifier: str, file_name: str):
     uid = identifier
-    print(f"{uid} - HTTP upload request: {file_name}" )
+    log.info("%s - HTTP upload request: %s", uid, file_name)
+
+    if _invalid_identifier(identifier):
+        return INVALID_REQUEST
+
+    if 'content-length' not in request.headers:
+        return LENGTH_REQUIRED
 
     file = Duplex.get_file_from_request(request)
 
@@ -19,37 +34,45 @@ async def http_upload(request: Request, identifier: str, file_name: str):
 
     duplex = Duplex.create_duplex(identifier, file)
 
-    print(f"{uid} - Waiting for client to connect...")
+    log.info("%s - Waiting for client to connect...", uid)
     await duplex.client_connected.wait()
 
-    print(f"{uid} - Client connected. Uploading...")
-    await duplex.transfer(request.stream())
+    log.info("%s - Client connected. Uploading...", uid)
+    async with uploads:
+        await duplex.transfer(coalesce(request.stream()))
+
+    if not duplex.completed:
+        log.warning("%s - Receiver disconnected.", uid)
+        return PlainTextResponse("Receiver disconnected.", status_code=502)
 
-    print(f"{uid} - Upload complete.")
+    log.info("%s - Upload complete.", uid)
     return PlainTextResponse("Transfer complete.", status_code=200)
 
 
 @router.get("/{identifier}")
 async def http_download(identifier: str):
     uid = identifier
-    if '.' in identifier or '/' in identifier:
-        return PlainTextResponse("Invalid request.", status_code=400)
+    if _invalid_identifier(identifier):
+        return INVALID_REQUEST
 
-    try:
-        duplex = Duplex.get(identifier)
-        print(f"{uid} - HTTP download request." )
-    except KeyError:
-        return PlainTextResponse("File not found.", status_code=404)
+    if not Duplex.exists(identifier):
+        return NOT_FOUND
 
-    print(f"{uid} - Notifying client is connected.")
-    duplex.client_connected.set()
-    await asyncio.sleep(0.5)
+    duplex = Duplex.get(identifier)
+    log.info("%s - HTTP download request.", uid)
 
-    file_name, file_size, file_type = duplex.get_file_info()
+    log.info("%s - Notifying client is connected.", uid)
+    duplex.client_connected.set()
+    try:
+        await asyncio.wait_for(duplex.sender_ready.wait(), timeout=30)
+    except asyncio.TimeoutError:
+        log.warning("%s - Sender did not start.", uid)
+        duplex.close()
+        return PlainTextResponse("Sender did not start.", status_code=504)
 
-    print(f"{uid} - Starting download.")
+    log.info("%s - Starting download.", uid)
     return StreamingResponse(
         duplex.receive(),
-        media_type=file_type,
-        headers={"Content-Disposition": f"attachment; filename={file_name}", "Content-Length": str(file_size)}
+        media_type=duplex.file.content_type,
+        headers=duplex.response_headers
     )
@@ -1,24 +1,27 @@
 import asyncio
+import orjson
 from fastapi import WebSocket, APIRouter
 
-from lib import Duplex
+from lib import Duplex, coalesce, uploads
+from lib.logging import get_logger
 
 
 router = APIRouter()
+log = get_logger('websockets')
 
 
 @router.websocket("/send/{identifier}")
 async def websocket_upload(websocket: WebSocket, identifier: str):
     uid = identifier
     await websocket.accept()
-    print(f"{uid} - Websocket upload request." )
+    log.info("%s - Websocket upload request.", uid)
 
-    header = await websocket.receive_json()
+    header = await websocket.receive_text()
 
     try:
-        file = Duplex.get_file_from_header(header)
-    except KeyError:
-        print(f"{uid} - Invalid header: {header}")
+        file = Duplex.get_file_from_header(orjson.loads(header))
+    except (KeyError, TypeError, ValueError):
+        log.warning("%s - Invalid header: %s", uid, header)
         return
 
     duplex = Duplex.create_duplex(uid, file)
@@ -26,38 +29,58 @@ async def websocket_upload(websocket: WebSocket, identifier: str):
     await duplex.client_connected.wait()
     await websocket.send_text("Go for file chunks")
 
-    print(f"{uid} - Starting upload...")
-    await duplex.transfer(websocket.iter_bytes())
+    log.info("%s - Starting upload...", uid)
+    async with uploads:
+        await duplex.transfer(coalesce(websocket.iter_bytes()))
 
-    print(f"{uid} - Upload complete.")
+    if not duplex.completed:
+        log.warning("%s - Receiver disconnected.", uid)
+        await websocket.close(code=1011, reason="Receiver disconnected.")
+        return
+
+    log.info("%s - Upload complete.", uid)
 
 
 @router.websocket("/receive/{identifier}")
 async def websocket_download(websocket: WebSocket, identifier: str):
     uid = identifier
     await websocket.accept()
-    print(f"{uid} - Websocket download request." )
+    log.info("%s - Websocket download request.", uid)
 
-    try:
-        duplex = Duplex.get(identifier)
-    except KeyError:
-        print(f"{uid} - File not found.")
+    if not Duplex.exists(identifier):
+        log.info("%s - File not found.", uid)
         await websocket.send_text("File not found")
         return
 
-    file_name, file_size, file_type = duplex.get_file_info()
-    await websocket.send_json({'file_name': file_name, 'file_size': file_size, 'file_type': file_type})
+    duplex = Duplex.get(identifier)
 
-    print(f"{uid} - Waiting for go-ahead...")
+    file = duplex.file
+    await websocket.send_text(orjson.dumps({'file_name': file.name, 'file_size': file.size, 'file_type': file.content_type}).decode())
+
+    log.info("%s - Waiting for go-ahead...", uid)
     while (msg := await websocket.receive_text()) != "Go for file chunks":
-        print(f"{uid} - Unexpected message: {msg}")
+        log.warning("%s - Unexpected message: %s", uid, msg)
+
+    if duplex.closed:
+        log.info("%s - File not found.", uid)
+        await websocket.send_text("File not found")
+        return
 
-    print(f"{uid} - Notifying client is connected.")
+    log.info("%s - Notifying client is connected.", uid)
     duplex.client_connected.set()
-    await asyncio.sleep(0.5)
+    try:
+        await asyncio.wait_for(duplex.sender_ready.wait(), timeout=30)
+    except asyncio.TimeoutError:
+        log.warning("%s - Sender did not start.", uid)
+        duplex.close()
+        await websocket.close()
+        return
 
-    print(f"{uid} - Starting download...")
-    async for chunk in duplex.receive():
-        await websocket.send_bytes(chunk)
+    log.info("%s - Starting download...", uid)
+    try:
+        async for chunk in coalesce(duplex.receive(), flush_after=0.002):
+            await websocket.send_bytes(chunk)
+    finally:
+        duplex.close()
     await websocket.send_bytes(b'')
-    print(f"{uid} - Download complete.")
+    log.info("%s - Download complete.", uid)
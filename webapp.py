@@ -1,7 +1,8 @@
+import hashlib
 from pathlib import Path
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import Response
 
 from views import http_router, ws_router
 
@@ -9,21 +10,52 @@ from views import http_router, ws_router
 app = FastAPI()
 
 
-@app.get('/')
-async def index():
-    return FileResponse('static/index.html')
+def cached_file(path: str, media_type: str):
+    content = Path(path).read_bytes()
+    etag = f'"{hashlib.blake2b(content, digest_size=8).hexdigest()}"'
+    headers = {'ETag': etag, 'Cache-Control': 'public, max-age=60'}
+    return etag, Response(content, media_type=media_type, headers=headers), Response(status_code=304, headers=headers)
 
 
-@app.get('/robots.txt')
-async def robots():
-    return FileResponse('static/robots.txt')
+INDEX_ETAG, INDEX, INDEX_NOT_MODIFIED = cached_file('static/index.html', 'text/html')
+ROBOTS_ETAG, ROBOTS, ROBOTS_NOT_MODIFIED = cached_file('static/robots.txt', 'text/plain')
+
+HEALTH_START = {
+    'type': 'http.response.start',
+    'status': 200,
+    'headers': [(b'content-type', b'application/json'), (b'content-length', b'15')]
+}
+HEALTH_BODY = {'type': 'http.response.body', 'body': b'{"status":"ok"}'}
+
 
+class HealthCheckMiddleware:
 
-@app.get("/health")
-async def get_health():
-    return {"status": "ok"}
+    def __init__(self, app):
+        self.app = app
 
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['path'] == '/health' and scope['method'] in ('GET', 'HEAD'):
+            await send(HEALTH_START)
+            await send(HEALTH_BODY)
+            return
+        await self.app(scope, receive, send)
+
+
+@app.get('/')
+async def index(request: Request):
+    if request.headers.get('if-none-match') == INDEX_ETAG:
+        return INDEX_NOT_MODIFIED
+    return INDEX
 
+
+@app.get('/robots.txt')
+async def robots(request: Request):
+    if request.headers.get('if-none-match') == ROBOTS_ETAG:
+        return ROBOTS_NOT_MODIFIED
+    return ROBOTS
+
+
+app.add_middleware(HealthCheckMiddleware)
 app.include_router(http_router)
 app.include_router(ws_router)
 
@@ -36,3 +68,8 @@ if Path('/extra').exists():
     app.mount('/css', StaticFiles(directory='/extra'), name='css')
 else:
     app.mount('/css', StaticFiles(directory='static'), name='css')
+
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, host='0.0.0.0', port=80, loop='auto', http='httptools', ws='websockets', ws_per_message_deflate=False)